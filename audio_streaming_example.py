@@ -1,28 +1,322 @@
 import sounddevice as sd
 import numpy as np
-import queue
+import functools
+import collections
+import concurrent.futures
+import multiprocessing
 import threading
+import time
 
-def generate_sine_wave(frequency, duration, sample_rate=44100):
+try:
+    from numba import njit
+    _HAVE_NUMBA = True
+except ImportError:
+    # Numba is optional; fsk_demodulate falls back to a vectorised NumPy path.
+    _HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        return lambda func: func
+
+# Maps demodulated 0/1 bytes to the ASCII '0'/'1' characters
+_BIT_CHARS = bytes.maketrans(b"\x00\x01", b"01")
+# Number of stream chunks the audio ring buffer can hold
+RING_CHUNKS = 8
+# Number of worker threads demodulating stream chunks
+DEMOD_WORKERS = 2
+# Fraction of the best timing score within which the expected timing is kept
+TIMING_TOLERANCE = 0.01
+# Number of bits over which the bit timing scores fade
+TIMING_MEMORY = 32
+# Number of bits scored past a bit before it is decided
+TIMING_LOOKAHEAD = 4
+# Fraction of a sample the bit timing may move by per sample received
+TIMING_SLEW = 1 / 16
+
+def nearest_bin(frequency, num_samples, sample_rate=44100):
+    """
+    Finds the DFT bin nearest to a tone.
+
+    Args:
+        frequency (float): Frequency of the tone in Hz.
+        num_samples (int): Number of samples in each analysis block.
+        sample_rate (int, optional): Number of samples per second. Defaults to 44100.
+
+    Returns:
+        int: The bin index k = round(frequency*N/sample_rate).
+    """
+    return round(frequency * num_samples / sample_rate)
+
+def goertzel_coefficient(frequency, num_samples, sample_rate=44100):
+    """
+    Computes the Goertzel coefficient for the DFT bin nearest to a tone.
+
+    Args:
+        frequency (float): Frequency of the tone in Hz.
+        num_samples (int): Number of samples in each analysis block.
+        sample_rate (int, optional): Number of samples per second. Defaults to 44100.
+
+    Returns:
+        float: The coefficient 2*cos(2*pi*k/N) for the bin from nearest_bin().
+    """
+    k = nearest_bin(frequency, num_samples, sample_rate)
+    return 2 * np.cos(2 * np.pi * k / num_samples)
+
+@njit(cache=True, fastmath=True, nogil=True)
+def _sliding_energies_numba(signal, samples_per_bit, coeff_high, coeff_low):
+    """
+    Compiled sliding Goertzel kernel.  Runs the filter for both tones over
+    the whole signal in one pass, giving the energy of the bit window that
+    starts at every sample.  Releases the GIL so that stream_audio's worker
+    threads run it on several chunks in parallel.
+
+    Args:
+        signal (numpy.ndarray): Contiguous float32 samples.
+        samples_per_bit (int): Number of samples in each bit window.
+        coeff_high (float): Goertzel coefficient for the '1' tone.
+        coeff_low (float): Goertzel coefficient for the '0' tone.
+
+    Returns:
+        tuple: float32 arrays of the '1' and '0' tone magnitudes, one per
+        window that fits in the signal.
+    """
+    num_starts = max(len(signal) - samples_per_bit + 1, 0)
+    energy_high = np.empty(num_starts, dtype=np.float32)
+    energy_low = np.empty(num_starts, dtype=np.float32)
+
+    # The comb term drops the sample leaving the window; since the bins sit
+    # exactly on a DFT bin, the state then always matches a fresh Goertzel
+    # over the window.
+    high_1 = 0.0
+    high_2 = 0.0
+    low_1 = 0.0
+    low_2 = 0.0
+    for n in range(len(signal)):
+        sample = signal[n]
+        if n >= samples_per_bit:
+            sample -= signal[n - samples_per_bit]
+        high_0 = sample + coeff_high * high_1 - high_2
+        high_2 = high_1
+        high_1 = high_0
+        low_0 = sample + coeff_low * low_1 - low_2
+        low_2 = low_1
+        low_1 = low_0
+        start = n - samples_per_bit + 1
+        if start >= 0:
+            energy_high[start] = np.sqrt(max(
+                high_1 * high_1 + high_2 * high_2
+                - coeff_high * high_1 * high_2, 0.0))
+            energy_low[start] = np.sqrt(max(
+                low_1 * low_1 + low_2 * low_2
+                - coeff_low * low_1 * low_2, 0.0))
+    return energy_high, energy_low
+
+@functools.lru_cache(maxsize=16)
+def _reference_tones(freq_high, freq_low, num_samples, sample_rate):
+    """
+    Cosine and sine references for the DFT bins nearest to both tones.
+    Both repeat every num_samples samples, so tiling them and projecting any
+    window onto them gives the same bin magnitude as the Goertzel
+    recurrence.  Cached so they are only evaluated once per configuration.
+
+    Args:
+        freq_high (float): Frequency for the '1' bit in Hz.
+        freq_low (float): Frequency for the '0' bit in Hz.
+        num_samples (int): Number of samples in each bit window.
+        sample_rate (int): Number of samples per second.
+
+    Returns:
+        numpy.ndarray: Read-only (num_samples, 4) float32 array holding the
+        cosine and sine of the '1' tone followed by those of the '0' tone.
+    """
+    n = np.arange(num_samples)
+    columns = []
+    for frequency in (freq_high, freq_low):
+        k = nearest_bin(frequency, num_samples, sample_rate)
+        columns.append(np.cos(2 * np.pi * k * n / num_samples))
+        columns.append(np.sin(2 * np.pi * k * n / num_samples))
+    references = np.stack(columns, axis=1).astype(np.float32)
+    references.flags.writeable = False
+    return references
+
+def _sliding_energies_numpy(signal, samples_per_bit, references):
     """
-    Generates a sine wave.
+    Vectorised counterpart of _sliding_energies_numba() for when Numba is
+    missing.  Gets the same energies from running sums of the signal times
+    the tiled references: each window is the difference of two prefix sums.
 
     Args:
-        frequency (float): Frequency of the sine wave in Hz.
-        duration (float): Duration of the sine wave in seconds.
+        signal (numpy.ndarray): Contiguous float32 samples.
+        samples_per_bit (int): Number of samples in each bit window.
+        references (numpy.ndarray): Output of _reference_tones().
+
+    Returns:
+        tuple: Arrays of the '1' and '0' tone magnitudes, one per window
+        that fits in the signal.
+    """
+    if len(signal) < samples_per_bit:
+        return np.empty(0), np.empty(0)
+    num_periods = -(-len(signal) // samples_per_bit)
+    projections = []
+    for reference in references.T:
+        tiled = np.tile(reference, num_periods)[:len(signal)]
+        # Accumulate in double precision; the prefix sums grow with the
+        # signal.
+        prefix = np.zeros(len(signal) + 1)
+        np.cumsum(signal * tiled, out=prefix[1:])
+        projections.append(prefix[samples_per_bit:] - prefix[:-samples_per_bit])
+    return (np.hypot(projections[0], projections[1]),
+            np.hypot(projections[2], projections[3]))
+
+def sliding_tone_energies(received_signal, freq_high, freq_low, bit_duration,
+                          sample_rate=44100):
+    """
+    Computes the energy of both tones in the bit window starting at every
+    sample, with a sliding Goertzel filter.
+
+    Args:
+        received_signal (numpy.ndarray): The FSK modulated signal.
+        freq_high (float): Frequency for the '1' bit in Hz.
+        freq_low (float): Frequency for the '0' bit in Hz.
+        bit_duration (float): Duration of each bit in seconds.
         sample_rate (int, optional): Number of samples per second. Defaults to 44100.
 
     Returns:
-        numpy.ndarray: The generated sine wave as a NumPy array.
+        tuple: Arrays of the '1' and '0' tone magnitudes, one per window
+        that fits in the signal, ready for TimingRecovery.process().
     """
-    time_vector = np.linspace(0, duration, int(sample_rate * duration), endpoint=False)
-    sine_wave = np.sin(2 * np.pi * frequency * time_vector)
-    return sine_wave
+    # The stream delivers (frames, channels) float32 blocks, so this is just a
+    # flat view of the mono samples; anything else is converted once here.
+    received_signal = np.ascontiguousarray(np.ravel(received_signal),
+                                           dtype=np.float32)
+    # Detection deliberately runs at the full sample rate.  Low-pass filtering
+    # and decimating first (a 63-tap polyphase FIR down by 7 to 6.3 kHz) was
+    # measured to cost more per sample than the Goertzel pass it shortens.
+    samples_per_bit = int(sample_rate * bit_duration)
+
+    # Both tones are fixed for the whole signal, so only compute the
+    # Goertzel coefficients (or fetch the cached references) once rather than
+    # regenerating sines per bit.
+    if _HAVE_NUMBA:
+        coeff_high = goertzel_coefficient(freq_high, samples_per_bit,
+                                          sample_rate)
+        coeff_low = goertzel_coefficient(freq_low, samples_per_bit,
+                                         sample_rate)
+        return _sliding_energies_numba(received_signal, samples_per_bit,
+                                       coeff_high, coeff_low)
+    references = _reference_tones(freq_high, freq_low, samples_per_bit,
+                                  sample_rate)
+    return _sliding_energies_numpy(received_signal, samples_per_bit,
+                                   references)
+
+class TimingRecovery:
+    """
+    Recovers the bit timing of a stream from its sliding tone energies and
+    decides the bits.  Energies are fed in stream order.  Every window is
+    scored once, on arrival, into a running score for its offset within a
+    bit, so the timing rests on the whole recent stream however short the
+    chunks are.  Bits are stepped one bit apart from the last decided one,
+    so none is dropped or repeated between chunks.
+
+    Args:
+        samples_per_bit (int): Number of samples in each bit window.
+        threshold_factor (float, optional): See fsk_demodulate().
+    """
+
+    def __init__(self, samples_per_bit, threshold_factor=0.5):
+        self._samples_per_bit = samples_per_bit
+        self._threshold_factor = threshold_factor
+        # Leaky sums of how well each offset separates the tones, indexed by
+        # stream position modulo samples_per_bit.
+        self._scores = np.zeros(samples_per_bit)
+        # Current bit timing, as a stream position modulo samples_per_bit.
+        self._offset = 0
+        # Energies not yet decided, and the stream position of the first.
+        self._energy_high = np.empty(0, dtype=np.float32)
+        self._energy_low = np.empty(0, dtype=np.float32)
+        self._position = 0
+        # Stream position one bit after the last decided window.
+        self._next = 0
+
+    def process(self, energy_high, energy_low, final=False):
+        """
+        Decides the bits whose windows start in the energies seen so far.
+
+        Args:
+            energy_high (numpy.ndarray): Next '1' tone magnitudes from
+                sliding_tone_energies(), following on from the previous call.
+            energy_low (numpy.ndarray): Matching '0' tone magnitudes.
+            final (bool, optional): Decide every remaining window instead of
+                holding the last TIMING_LOOKAHEAD bits back for the next call.
+
+        Returns:
+            numpy.ndarray: uint8 array of the newly decided 0/1 bits.
+        """
+        samples_per_bit = self._samples_per_bit
+        half_bit = samples_per_bit // 2
+
+        # Fold the new windows into the scores of their offsets, letting
+        # older ones fade over TIMING_MEMORY bits so the timing can drift.
+        arrival = self._position + len(self._energy_high)
+        self._scores *= np.exp(-len(energy_high)
+                               / (samples_per_bit * TIMING_MEMORY))
+        offsets = (arrival + np.arange(len(energy_high))) % samples_per_bit
+        self._scores += np.bincount(offsets,
+                                    weights=np.abs(energy_high - energy_low),
+                                    minlength=samples_per_bit)
+
+        # The score peaks broadly around the true timing, so rather than
+        # chase noise keep the offset nearest the current one that scores
+        # within TIMING_TOLERANCE of the best.
+        shifts = (np.arange(samples_per_bit) - self._offset) % samples_per_bit
+        distance = np.minimum(shifts, samples_per_bit - shifts)
+        distance[self._scores < self._scores.max() * (1 - TIMING_TOLERANCE)] = \
+            samples_per_bit
+        offset = np.argmin(distance)
+        # Once bits have been decided, the timing may only slew by
+        # TIMING_SLEW samples per sample received, so a stretch of equal
+        # bits, which scores every offset alike, cannot make it jump.
+        if self._next:
+            shift = ((offset - self._offset + half_bit) % samples_per_bit
+                     - half_bit)
+            limit = int(len(energy_high) * TIMING_SLEW)
+            offset = (self._offset + min(max(shift, -limit), limit)) \
+                % samples_per_bit
+        self._offset = offset
+
+        # The next bit starts at the chosen offset, within half a bit of one
+        # bit after the last.  Decide it and those after it once the windows
+        # up to TIMING_LOOKAHEAD bits later have been scored, or all of them
+        # at the end.
+        energy_high = np.concatenate([self._energy_high, energy_high])
+        energy_low = np.concatenate([self._energy_low, energy_low])
+        first = (self._next + (self._offset - self._next + half_bit)
+                 % samples_per_bit - half_bit)
+        if first < 0:
+            first += samples_per_bit
+        end = self._position + len(energy_high)
+        if not final:
+            end -= TIMING_LOOKAHEAD * samples_per_bit
+        starts = np.arange(first, max(end, first), samples_per_bit)
+        starts -= self._position
+        bits = (energy_high[starts]
+                > (energy_high[starts] + energy_low[starts])
+                * self._threshold_factor).view(np.uint8)
+
+        # Keep everything from half a bit before the next expected window.
+        if len(starts):
+            self._next = first + len(starts) * samples_per_bit
+        carry = max(self._next - half_bit - self._position, 0)
+        self._energy_high = energy_high[carry:]
+        self._energy_low = energy_low[carry:]
+        self._position += carry
+        return bits
 
 def fsk_demodulate(received_signal, freq_high, freq_low, bit_duration, 
                    sample_rate=44100, threshold_factor=0.5):
     """
-    FSK demodulates a received signal.
+    FSK demodulates a received signal.  The bit timing is recovered from the
+    signal itself, so it need not start on a bit boundary; only bits whose
+    window fits entirely in the signal are decided.
 
     Args:
         received_signal (numpy.ndarray): The FSK modulated signal to demodulate.
@@ -36,28 +330,80 @@ def fsk_demodulate(received_signal, freq_high, freq_low, bit_duration,
     Returns:
         str: The demodulated bit string.
     """
-    demodulated_bits = ""
-    num_bits = int(len(received_signal) / (sample_rate * bit_duration))
-    print(num_bits)
-    for i in range(num_bits):
-        start_sample = int(i * sample_rate * bit_duration)
-        end_sample = int((i + 1) * sample_rate * bit_duration)
-        bit_signal = received_signal[start_sample:end_sample]
+    energy_high, energy_low = sliding_tone_energies(
+        received_signal, freq_high, freq_low, bit_duration, sample_rate)
+    timing = TimingRecovery(int(sample_rate * bit_duration), threshold_factor)
+    bits = timing.process(energy_high, energy_low, final=True)
+
+    # Only build the string at the very end.
+    return bits.tobytes().translate(_BIT_CHARS).decode("ascii")
+
+class RingBuffer:
+    """
+    Preallocated single-producer, single-consumer ring buffer of mono audio
+    samples.  The audio callback writes and the processing loop reads; each
+    side only ever advances its own index, so no lock is needed.
+
+    Args:
+        num_frames (int): Capacity of the buffer in frames.
+    """
+
+    def __init__(self, num_frames):
+        self._buffer = np.zeros(num_frames, dtype=np.float32)
+        # Running totals of frames written and read.  Their difference is the
+        # number of committed frames waiting to be read.
+        self._head = multiprocessing.RawValue('Q', 0)
+        self._tail = multiprocessing.RawValue('Q', 0)
+
+    def write(self, samples):
+        """
+        Copies samples into the buffer, wrapping around the end if needed.
+
+        Args:
+            samples (numpy.ndarray): The mono samples to append.
 
-        # Calculate the energy at each frequency.  More robust than just one sample.
-        energy_high = np.sum(np.abs(bit_signal * generate_sine_wave(freq_high, bit_duration, sample_rate)))
-        energy_low = np.sum(np.abs(bit_signal * generate_sine_wave(freq_low, bit_duration, sample_rate)))
+        Returns:
+            bool: False if there was not enough free space, in which case
+            nothing is written.
+        """
+        size = len(self._buffer)
+        frames = len(samples)
+        head = self._head.value
+        if frames > size - (head - self._tail.value):
+            return False
+        start = head % size
+        first = min(frames, size - start)
+        np.copyto(self._buffer[start:start + first], samples[:first])
+        np.copyto(self._buffer[:frames - first], samples[first:])
+        # Only publish the new head once the samples are in place.
+        self._head.value = head + frames
+        return True
 
-        # Use a threshold relative to the *sum* of the energies.
-        threshold = (energy_high + energy_low) * threshold_factor
+    def read(self, out):
+        """
+        Copies the oldest committed frames into out, wrapping around the end
+        if needed.
 
-        if energy_high > threshold and energy_low < threshold:
-            demodulated_bits += '1'
-        elif energy_low > threshold and energy_high < threshold:
-            demodulated_bits += '0'
-    return demodulated_bits
+        Args:
+            out (numpy.ndarray): Preallocated array to fill completely.
 
-def audio_callback(indata, frames, time, status, audio_queue, freq_high, freq_low, bit_duration, sample_rate):
+        Returns:
+            bool: False if fewer than len(out) frames are committed, in which
+            case nothing is read.
+        """
+        size = len(self._buffer)
+        frames = len(out)
+        tail = self._tail.value
+        if frames > self._head.value - tail:
+            return False
+        start = tail % size
+        first = min(frames, size - start)
+        np.copyto(out[:first], self._buffer[start:start + first])
+        np.copyto(out[first:], self._buffer[:frames - first])
+        self._tail.value = tail + frames
+        return True
+
+def audio_callback(indata, frames, time, status, ring_buffer, freq_high, freq_low, bit_duration, sample_rate):
     """
     Callback function for the sounddevice audio stream.  This function is called
     whenever a new chunk of audio data is available from the microphone.
@@ -67,7 +413,7 @@ def audio_callback(indata, frames, time, status, audio_queue, freq_high, freq_lo
         frames (int): The number of frames in the audio data.
         time (cffi.CData):  Timestamp information (not used here).
         status (int):  Status flags (e.g., for buffer overflows).
-        audio_queue (queue.Queue):  A queue to put the audio data into.
+        ring_buffer (RingBuffer):  The ring buffer to write the audio data into.
         freq_high (float): Frequency for the '1' bit in Hz.
         freq_low (float): Frequency for the '0' bit in Hz.
         bit_duration (float): Duration of each bit in seconds.
@@ -76,11 +422,10 @@ def audio_callback(indata, frames, time, status, audio_queue, freq_high, freq_lo
     if status:
         print(f"Error in audio stream: {status}")
         return
-    # Copy the audio data to the queue.  Use non-blocking to avoid potential issues.
-    try:
-        audio_queue.put_nowait(indata.copy())
-    except queue.Full:
-        print("Queue full") 
+    # Copy the mono samples straight into the preallocated ring buffer rather
+    # than allocating and enqueuing a copy from the realtime thread.
+    if not ring_buffer.write(indata[:, 0]):
+        print("Ring buffer full") 
 
 def stream_audio(sample_rate=44100, chunk_size=1024, freq_high=2000, freq_low=1000, bit_duration=0.1):
     """
@@ -93,18 +438,55 @@ def stream_audio(sample_rate=44100, chunk_size=1024, freq_high=2000, freq_low=10
         freq_low (float): Frequency for the '0' bit in Hz.
         bit_duration (float): Duration of each bit in seconds.
     """
-    audio_queue = queue.Queue(maxsize=100)  # Create a queue to hold audio data
+    ring_buffer = RingBuffer(RING_CHUNKS * chunk_size)  # Holds the audio data
+    samples_per_bit = int(sample_rate * bit_duration)
+    # Each buffer starts with the last samples_per_bit - 1 samples of the
+    # chunk before it, so the bit windows straddling chunks are seen too.
+    history = samples_per_bit - 1
+    # One buffer per in-flight chunk, reused round robin.
+    audio_buffers = [np.empty(history + chunk_size, dtype=np.float32)
+                     for _ in range(DEMOD_WORKERS)]
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=DEMOD_WORKERS)
+    pending = collections.deque()  # Energy futures in submission order
+    # The bit timing runs across chunks, so it is tracked here, in order.
+    timing = TimingRecovery(samples_per_bit)
+    sequence = 0
     try:
         # Open the audio stream.  Importantly, use a non-blocking stream.
+        # Bind the extra arguments with partial rather than a lambda, so
+        # each callback goes straight into audio_callback.
+        callback = functools.partial(audio_callback, ring_buffer=ring_buffer,
+                                     freq_high=freq_high, freq_low=freq_low,
+                                     bit_duration=bit_duration,
+                                     sample_rate=sample_rate)
         stream = sd.InputStream(samplerate=sample_rate, blocksize=chunk_size,
-                                channels=1, callback=(lambda indata, frames, time, status: audio_callback(indata, frames, time, status, audio_queue, freq_high, freq_low, bit_duration, sample_rate)))
+                                channels=1, dtype='float32', callback=callback)
         stream.start() # Start the stream.
 
         print("Audio stream started.  Press Ctrl+C to stop.")
-        # Process audio data from the queue in a loop.
+        # Process audio data from the ring buffer in a loop.
         while True:
             try:
-                audio_data = audio_queue.get(timeout=1)  # Get data from the queue.
+                # Print finished chunks in order.  Once every buffer is in
+                # flight, wait for the oldest so its buffer can be reused.
+                while pending and (pending[0].done()
+                                   or len(pending) == DEMOD_WORKERS):
+                    bits = timing.process(*pending.popleft().result())
+                    bits = bits.tobytes().translate(_BIT_CHARS).decode("ascii")
+                    print(f"Demodulated bits: {bits}")
+
+                audio_data = audio_buffers[sequence % DEMOD_WORKERS]
+                # Get a chunk of data.
+                if not ring_buffer.read(audio_data[history:]):
+                    # Nothing committed yet; wait briefly rather than spin.
+                    time.sleep(0.01)
+                    continue
+                # Prepend the tail of the previous chunk, which is still
+                # intact while its own energies are computed.
+                carried = min(history, sequence * chunk_size)
+                previous = audio_buffers[(sequence - 1) % DEMOD_WORKERS]
+                audio_data[history - carried:history] = \
+                    previous[len(previous) - carried:]
                 # Now you can process the audio_data.  For example, you could:
                 # 1.  Analyze it (e.g., for volume, frequency content).
                 # 2.  Send it over a network.
@@ -112,23 +494,19 @@ def stream_audio(sample_rate=44100, chunk_size=1024, freq_high=2000, freq_low=10
                 # 4.  Pass it to a machine learning model.
                 # print(f"Received audio data of shape {audio_data.shape}") # uncomment this line to see the shape of the audio data.
 
-                # Demodulate the audio data
-                demodulated_bits = fsk_demodulate(audio_data, freq_high, 
-                                                  freq_low, bit_duration, 
-                                                  sample_rate)
-                print(f"Demodulated bits: {demodulated_bits}")
-
-            except queue.Empty:
-                # This exception will be raised if the queue is empty after the timeout.
-                # It's normal to get this occasionally, especially if the processing
-                # in this loop is slow.  You might want to add a small sleep here
-                # to reduce CPU usage if you're not doing much processing.
-                # time.sleep(0.01)
-                pass # No operation
+                # Filter the audio data on a worker thread so this loop
+                # keeps draining the ring buffer.
+                pending.append(executor.submit(sliding_tone_energies,
+                                               audio_data[history - carried:],
+                                               freq_high, freq_low,
+                                               bit_duration, sample_rate))
+                sequence += 1
+
             except KeyboardInterrupt:
                 print("Stopping audio stream...")
                 stream.stop()
                 stream.close()
+                executor.shutdown(wait=False, cancel_futures=True)
                 break # Exit the loop
     except Exception as e:
         print(f"Error streaming audio: {e}")
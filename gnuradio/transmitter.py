@@ -15,7 +15,6 @@ from gnuradio import analog
 import math
 from gnuradio import audio
 from gnuradio import blocks
-import numpy
 from gnuradio import digital
 from gnuradio import filter
 from gnuradio.filter import firdes
@@ -27,6 +26,7 @@ from PyQt5 import Qt
 from argparse import ArgumentParser
 from gnuradio.eng_arg import eng_float, intx
 from gnuradio import eng_notation
+import numpy
 import sip
 import threading
 
@@ -70,6 +70,7 @@ class transmitter(gr.top_block, Qt.QWidget):
         ##################################################
         self.variable_0 = variable_0 = 0
         self.samp_rate = samp_rate = 44100
+        self.prbs_bits = prbs_bits = numpy.random.default_rng(0).integers(0, 2, 1000, dtype=numpy.uint8)
         self.fsk_deviation = fsk_deviation = 500
         self.freq_low = freq_low = 1000
         self.freq_high = freq_high = 2000
@@ -267,6 +268,7 @@ class transmitter(gr.top_block, Qt.QWidget):
         self.top_layout.addWidget(self._qtgui_freq_sink_x_0_win)
         self.freq_xlating_fir_filter_xxx_0 = filter.freq_xlating_fir_filter_fcf(1, firdes.low_pass(1,samp_rate,900,300), ((freq_high+freq_low)/2.0), samp_rate)
         self.digital_binary_slicer_fb_0 = digital.binary_slicer_fb()
+        self.blocks_vector_source_x_0 = blocks.vector_source_b(prbs_bits.tolist(), False, 1, [])
         self.blocks_throttle2_0 = blocks.throttle( gr.sizeof_float*1, samp_rate, True, 0 if "auto" == "auto" else max( int(float(0.1) * samp_rate) if "auto" == "time" else int(0.1), 1) )
         self.blocks_sub_xx_0 = blocks.sub_ff(1)
         self.blocks_repeat_0 = blocks.repeat(gr.sizeof_char*1, 100)
@@ -278,7 +280,6 @@ class transmitter(gr.top_block, Qt.QWidget):
         self.audio_sink_0 = audio.sink(samp_rate, '', True)
         self.analog_sig_source_x_0_0 = analog.sig_source_f(samp_rate, analog.GR_COS_WAVE, freq_high, 1, 0, 0)
         self.analog_sig_source_x_0 = analog.sig_source_f(samp_rate, analog.GR_COS_WAVE, freq_low, 1, 0, 0)
-        self.analog_random_source_x_0 = blocks.vector_source_b(list(map(int, numpy.random.randint(0, 2, 1000))), False)
         self.analog_quadrature_demod_cf_0 = analog.quadrature_demod_cf(10)
         self.analog_const_source_x_0 = analog.sig_source_f(0, analog.GR_CONST_WAVE, 0, 0, 1)
 
@@ -289,7 +290,6 @@ class transmitter(gr.top_block, Qt.QWidget):
         self.connect((self.analog_const_source_x_0, 0), (self.blocks_sub_xx_0, 0))
         self.connect((self.analog_quadrature_demod_cf_0, 0), (self.digital_binary_slicer_fb_0, 0))
         self.connect((self.analog_quadrature_demod_cf_0, 0), (self.qtgui_time_sink_x_1_0, 0))
-        self.connect((self.analog_random_source_x_0, 0), (self.blocks_repeat_0, 0))
         self.connect((self.analog_sig_source_x_0, 0), (self.blocks_multiply_xx_1, 1))
         self.connect((self.analog_sig_source_x_0_0, 0), (self.blocks_multiply_xx_0, 0))
         self.connect((self.blocks_add_xx_0, 0), (self.audio_sink_0, 0))
@@ -305,6 +305,7 @@ class transmitter(gr.top_block, Qt.QWidget):
         self.connect((self.blocks_sub_xx_0, 0), (self.blocks_multiply_xx_1, 0))
         self.connect((self.blocks_throttle2_0, 0), (self.freq_xlating_fir_filter_xxx_0, 0))
         self.connect((self.blocks_throttle2_0, 0), (self.qtgui_freq_sink_x_0, 0))
+        self.connect((self.blocks_vector_source_x_0, 0), (self.blocks_repeat_0, 0))
         self.connect((self.digital_binary_slicer_fb_0, 0), (self.blocks_char_to_float_1, 0))
         self.connect((self.freq_xlating_fir_filter_xxx_0, 0), (self.analog_quadrature_demod_cf_0, 0))
 
@@ -337,6 +338,13 @@ class transmitter(gr.top_block, Qt.QWidget):
         self.qtgui_time_sink_x_1.set_samp_rate(self.samp_rate)
         self.qtgui_time_sink_x_1_0.set_samp_rate(self.samp_rate)
 
+    def get_prbs_bits(self):
+        return self.prbs_bits
+
+    def set_prbs_bits(self, prbs_bits):
+        self.prbs_bits = prbs_bits
+        self.blocks_vector_source_x_0.set_data(self.prbs_bits.tolist(), [])
+
     def get_fsk_deviation(self):
         return self.fsk_deviation
 
@@ -1,7 +1,6 @@
 import socket
 import signal
 import sys
-import time
 
 HOST = "127.0.0.1"  # The server's hostname or IP address
 PORT = 12345        # The port used by the server
@@ -23,5 +22,3 @@ with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
         
         else:
             s.sendall(message.encode())
-
-        time.sleep(0.01)
\ No newline at end of file
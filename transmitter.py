@@ -1,15 +1,14 @@
+import asyncio
+import collections
+import functools
 import numpy as np
 import sounddevice as sd
-import socket
 import signal
 import sys
-import time
-from threading import Thread
 
 # Define the host and port
 host = "127.0.0.1"
 port = 12345
-clients = []
 
 # Signal processing global variables
 sample_rate = 44100
@@ -17,6 +16,16 @@ bit_duration = 0.01
 freq_high = 2000
 freq_low = 1000
 
+# Quarter-wave sine lookup table used by generate_sine_wave().  The extra
+# entry at pi/2 lets the mirrored quadrants index the table exactly.
+TABLE_LENGTH = 16384
+_TABLE_BITS = TABLE_LENGTH.bit_length() - 1
+SINETABLE = np.sin(np.linspace(0, np.pi / 2, TABLE_LENGTH + 1)).astype(np.float32)
+# Oscillator phases are unsigned 32-bit fractions of a cycle, so they wrap
+# around on their own.  The top bits pick the quadrant and table entry.
+PHASE_BITS = 32
+_PHASE_SHIFT = PHASE_BITS - 2 - _TABLE_BITS
+
 def signal_handler(sig, frame):
      print("Exiting the program now.")
      sys.exit(0)
@@ -24,6 +33,43 @@ def signal_handler(sig, frame):
 # Catch ctrl+c to exit program at any time
 signal.signal(signal.SIGINT, signal_handler)
 
+def _table_sine(phase):
+    """
+    Looks sines up in the quarter-wave table.  The other three quadrants are
+    reconstructed by mirroring the index and negating, without branches.
+
+    Args:
+        phase (numpy.ndarray): uint32 phases as fractions of 2**PHASE_BITS
+            of a cycle.
+
+    Returns:
+        numpy.ndarray: The sines of the phases as a float32 NumPy array.
+    """
+    # Round to the nearest table step; the addition wraps like the phase.
+    phase = (phase + np.uint32(1 << (_PHASE_SHIFT - 1))) >> _PHASE_SHIFT
+    quadrant = phase >> _TABLE_BITS
+    index = phase & (TABLE_LENGTH - 1)
+
+    # Mirror the index in the 2nd and 4th quadrants, negate the 2nd half.
+    index = np.where(quadrant & 1, TABLE_LENGTH - index, index)
+    sine_wave = SINETABLE[index]
+    np.negative(sine_wave, out=sine_wave, where=quadrant >= 2)
+    return sine_wave
+
+def phase_increment(frequency, sample_rate=sample_rate):
+    """
+    Computes how far the oscillator phase advances per sample for a tone.
+
+    Args:
+        frequency (float): Frequency of the tone in Hz.
+        sample_rate (int, optional): Number of samples per second. Defaults to 44100.
+
+    Returns:
+        numpy.uint32: The increment as a fraction of 2**PHASE_BITS of a cycle.
+    """
+    return np.uint32(round(2 ** PHASE_BITS * frequency / sample_rate)
+                     % 2 ** PHASE_BITS)
+
 def generate_sine_wave(frequency, duration=bit_duration, 
                        sample_rate=sample_rate):
     """
@@ -35,97 +81,167 @@ def generate_sine_wave(frequency, duration=bit_duration,
         sample_rate (int, optional): Number of samples per second. Defaults to 44100.
 
     Returns:
-        numpy.ndarray: The generated sine wave as a NumPy array.
+        numpy.ndarray: The generated sine wave as a float32 NumPy array.
+        Results are cached, so the array is read-only.
+    """
+    return _sine_wave(float(frequency), float(duration), int(sample_rate))
+
+@functools.lru_cache(maxsize=32)
+def _sine_wave(frequency, duration, sample_rate):
     """
-    time_vector = np.linspace(0, duration, int(sample_rate * duration), 
-                              endpoint=False)
-    sine_wave = np.sin(2 * np.pi * frequency * time_vector)
+    Cached body of generate_sine_wave().  The tones and durations in use
+    are few and fixed, so each is only generated once.
+    """
+    num_samples = int(sample_rate * duration)
+    # Integer phase accumulator: the phase advances by a fixed 32-bit
+    # increment per sample and wraps modulo one cycle.
+    phase = (np.arange(num_samples, dtype=np.uint32)
+             * phase_increment(frequency, sample_rate))
+    sine_wave = _table_sine(phase)
+    sine_wave.flags.writeable = False
     return sine_wave
 
-def generate_fsk_signal(data, freq_high=freq_high, freq_low=freq_low, 
-                        sample_rate=sample_rate, 
-                        duration=bit_duration) -> np.array:
+def _whole_cycles(freq_high, freq_low, sample_rate, duration):
     """
-    Generates an FSK signal for a given binary string.
+    Whether both tones complete a whole number of cycles per bit, in which
+    case every bit starts at zero phase and can be played from
+    _bit_waveforms().
     """
     samples_per_bit = int(sample_rate * duration)
-    time_vector = np.linspace(0, duration, samples_per_bit, endpoint=False)
-    signal = np.array([])
-    for bit in data:
-        if bit == '1':
-            signal = np.concatenate([signal, 
-                                     generate_sine_wave(freq_high, duration)])
-        else:
-            signal = np.concatenate([signal, 
-                                     generate_sine_wave(freq_low, duration)])
-    return signal
+    return all((frequency * samples_per_bit / sample_rate).is_integer()
+               for frequency in (freq_high, freq_low))
 
-def play_audio(signal, sample_rate=sample_rate):
+@functools.lru_cache(maxsize=16)
+def _bit_waveforms(freq_high, freq_low, sample_rate, duration):
     """
-    Plays the given audio signal.
+    Cached, read-only waveforms for a '0' and a '1' bit, each starting at
+    zero phase.
+
+    Returns:
+        numpy.ndarray: (2, samples_per_bit) float32 array holding the '0'
+        waveform in row 0 and the '1' waveform in row 1.
+    """
+    waveforms = np.stack([generate_sine_wave(freq_low, duration, sample_rate),
+                          generate_sine_wave(freq_high, duration, sample_rate)])
+    waveforms.flags.writeable = False
+    return waveforms
+
+def audio_callback(outdata, frames, time, status, bits_queue, waveforms,
+                   increments, sample_phases, phase):
+    """
+    Callback function for the sounddevice output stream.  Each block is one
+    bit long: it plays the next queued bit, or silence when none is queued.
+
+    Args:
+        outdata (numpy.ndarray): The (frames, 1) block of audio to fill.
+        frames (int): The number of frames, one bit's worth.
+        time (cffi.CData):  Timestamp information (not used here).
+        status (int):  Status flags (e.g., for buffer underflows).
+        bits_queue (collections.deque):  The 0/1 bits waiting to be sent.
+        waveforms (numpy.ndarray):  _bit_waveforms() of the tones when they
+            complete whole cycles per bit, otherwise None.
+        increments (numpy.ndarray):  uint32 phase_increment() of the '0' and
+            '1' tones.
+        sample_phases (numpy.ndarray):  uint32 np.arange(frames), the sample
+            offsets within a block.
+        phase (numpy.ndarray):  One-element uint32 array holding the
+            oscillator phase, carried over from block to block.
+    """
+    if status:
+        print(f"Error in audio stream: {status}")
+    try:
+        bit = bits_queue.popleft()
+    except IndexError:
+        # Nothing to send.  Restart the next message at zero phase so it
+        # does not begin with a click.
+        outdata.fill(0)
+        phase.fill(0)
+        return
+    if waveforms is not None:
+        # Every bit starts at zero phase, so just copy its cached waveform.
+        outdata[:, 0] = waveforms[bit]
+        return
+    # Otherwise continue the oscillator from the previous bit, so the tones
+    # join without phase jumps, which would spread energy across the
+    # spectrum.  Write straight into the output buffer.
+    # Slice rather than index, so the uint32 products stay arrays and wrap
+    # silently instead of warning like NumPy scalars do.
+    increment = increments[bit:bit + 1]
+    outdata[:, 0] = _table_sine(phase + increment * sample_phases)
+    phase += increment * np.uint32(frames)
+
+async def receive(reader, writer, bits_queue):
     """
-    sd.play(signal, sample_rate)
-    sd.wait()
+    Reads messages from one TCP client and queues their bits for
+    transmission.
 
-def receive(client_socket, addr):
-    global clients
+    Args:
+        reader (asyncio.StreamReader): Stream to read the client's messages from.
+        writer (asyncio.StreamWriter): Stream to the client, closed on exit.
+        bits_queue (collections.deque): The 0/1 bits waiting to be sent.
+    """
+    addr = writer.get_extra_info("peername")
+    print(f"Connection established: {addr[0]}:{addr[1]}")
 
     while True:
         try:
-            data = client_socket.recv(1024).decode("utf-8")
-            if data == "quit":
-                print("Connection interrupted.")
-                client_socket.close()
-                break
-            elif data != "":
-                print(f"Received from {addr}: {data}")
-
-                # Transmit received message over air as FSK modulated audio
-                # Convert ascii string to binary first
-                data_binary = bin(int.from_bytes(data.encode(), 'big'))
-                fsk_signal = generate_fsk_signal(data_binary)
-                print(f"Sending over air: {data}")
-                play_audio(fsk_signal)
-            else:
-                print("Connection interrupted.")
-                client_socket.close()
+            data = await reader.read(1024)
+            if data == b"quit" or data == b"":
                 break
+            # The bytes are sent as they are; only decode them for the log.
+            message = data.decode("utf-8", "replace")
+            print(f"Received from {addr}: {message}")
+
+            # Transmit received message over air as FSK modulated audio
+            # Convert the bytes to bits first, 8 per byte, MSB first.  The
+            # output stream synthesises them as it plays.
+            data_bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8))
+            print(f"Sending over air: {message}")
+            bits_queue.extend(data_bits.tolist())
 
         except Exception as ex:
             print(f"Exception: {ex}")
-            print("Connection interrupted.")
-            client_socket.close()
             break
 
-        time.sleep(0.01)
-    
-    client_socket.close()
-    if client_socket in clients:
-        clients.remove(client_socket)
+    print("Connection interrupted.")
+    writer.close()
+
+async def serve():
+    """
+    Accepts TCP clients on one event loop while a single output stream plays
+    their queued bits.
+    """
+    bits_queue = collections.deque()  # Bits waiting to be sent
+    samples_per_bit = int(sample_rate * bit_duration)
+    waveforms = None
+    if _whole_cycles(freq_high, freq_low, sample_rate, bit_duration):
+        waveforms = _bit_waveforms(freq_high, freq_low, sample_rate,
+                                   bit_duration)
+    increments = np.array([phase_increment(freq_low, sample_rate),
+                           phase_increment(freq_high, sample_rate)])
+    # Everything the callback needs is built here, outside the audio thread.
+    callback = functools.partial(audio_callback, bits_queue=bits_queue,
+                                 waveforms=waveforms, increments=increments,
+                                 sample_phases=np.arange(samples_per_bit,
+                                                         dtype=np.uint32),
+                                 phase=np.zeros(1, dtype=np.uint32))
+    # One block per bit, so the callback only ever handles a single tone.
+    with sd.OutputStream(samplerate=sample_rate, blocksize=samples_per_bit,
+                         channels=1, dtype='float32', callback=callback):
+        server = await asyncio.start_server(
+            functools.partial(receive, bits_queue=bits_queue), host, port)
+
+        print(f"Server listening on {host}:{port}")
+
+        async with server:
+            await server.serve_forever()
 
 def main():
     """
     Main loop for receiving messages over TCP socket, modulating and 
     transmitting.
     """
-
-    # Create a socket object
-    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-
-    # Create a server
-    server_socket.bind((host, port))
-    server_socket.listen()
-
-    print(f"Server listening on {host}:{port}")
-
-    while True:
-        # Make connections to clients
-        client_socket, addr = server_socket.accept()
-        print(f"Connection established: {addr[0]}:{addr[1]}")
-        clients.append(client_socket)
-        Thread(target=receive, args=(client_socket, addr)).start()
-
-        time.sleep(0.01)
+    asyncio.run(serve())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file